@@ -1,6 +1,193 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import google.generativeai as genai
 import librosa
 import numpy as np
-import whisper
+import soundfile as sf
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+from numba import njit
+from pydantic import BaseModel
+
+# Analysis frame geometry, shared by every per-frame feature so the
+# signal only has to be framed once.
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+
+# Sample rate used for pitch extraction. Speech f0 stays well below
+# 500 Hz, so 8 kHz is plenty and makes pyin several times faster.
+PITCH_SR = 8000
+
+# Speech f0 search band in Hz (fixed, so evaluated once here rather
+# than rebuilt from note names on every call)
+PITCH_FMIN = 65.0
+PITCH_FMAX = 500.0
+
+# Recordings longer than this are split on silence and transcribed in
+# parallel; each chunk aims for roughly Whisper's 30-second window.
+PARALLEL_THRESHOLD_SECONDS = 60
+CHUNK_TARGET_SECONDS = 30
+
+# Compiled once so every transcript chunk is scanned in a single pass
+FILLER_RE = re.compile(r"\b(um|uh|like|so|you know)\b", re.IGNORECASE)
+
+# Content-analysis responses are cached here, keyed by transcript hash
+CONTENT_CACHE_DIR = "cache"
+
+# Transcripts shorter than this go to the smaller, faster Gemini model
+SHORT_TRANSCRIPT_CHARS = 2000
+
+
+class FillerCount(BaseModel):
+    """One filler word and the number of times it was used."""
+
+    word: str
+    count: int
+
+
+class ContentReport(BaseModel):
+    """Response schema enforced on the Gemini content analysis."""
+
+    # A mapping would be natural here, but dict fields convert to an
+    # untyped OBJECT in the Gemini response schema (no properties),
+    # which the API rejects; a typed list of pairs converts cleanly.
+    filler_word_counts: list[FillerCount]
+    clarity_score: int
+    suggestions: list[str]
+    improved_sentence: str
+
+
+@lru_cache(maxsize=1)
+def get_whisper():
+    """
+    Loads the Whisper base model once and caches it for reuse.
+
+    Uses the CTranslate2 implementation (faster-whisper). On a CUDA
+    machine the model runs in float16, the standard ~5-20x speedup over
+    CPU inference; otherwise it falls back to int8 on CPU, which is
+    several times faster than the reference PyTorch package at
+    comparable accuracy. WHISPER_COMPUTE_TYPE overrides the compute
+    type in either case (e.g. int8_float16 to trade a little accuracy
+    for latency on GPU). Loading the model reallocates tensors and
+    re-reads weights from disk, so it must only ever happen on the
+    first call.
+
+    Returns:
+        The loaded WhisperModel instance.
+    """
+    device = "cpu"
+    compute_type = "int8"
+    try:
+        import ctranslate2
+
+        if ctranslate2.get_cuda_device_count() > 0:
+            device = "cuda"
+            compute_type = "float16"
+    except Exception:
+        pass
+    compute_type = os.getenv("WHISPER_COMPUTE_TYPE", compute_type)
+
+    if device == "cuda":
+        return WhisperModel("base", device="cuda", compute_type=compute_type)
+    return WhisperModel(
+        "base", device="cpu", compute_type=compute_type, cpu_threads=os.cpu_count()
+    )
+
+
+@lru_cache(maxsize=1)
+def get_gpu_pipeline():
+    """
+    Builds a GPU transcription pipeline when CUDA is available.
+
+    Uses the Hugging Face ASR pipeline in fp16 with BetterTransformer
+    kernels, which transcribes batched 30-second chunks several times
+    faster than the serial fp32 path. Returns None when no GPU (or the
+    optional torch/transformers dependencies) is present, in which case
+    callers fall back to the CPU model from get_whisper().
+
+    Returns:
+        The transcription pipeline, or None if unavailable.
+    """
+    try:
+        import torch
+        from transformers import pipeline
+    except ImportError:
+        return None
+
+    if not torch.cuda.is_available():
+        return None
+
+    pipe = pipeline(
+        "automatic-speech-recognition",
+        "openai/whisper-base",
+        torch_dtype=torch.float16,
+        device="cuda:0",
+    )
+    try:
+        pipe.model = pipe.model.to_bettertransformer()
+    except Exception:
+        # Requires the optional optimum package; the plain fp16
+        # pipeline is still a large win over CPU, so keep it.
+        pass
+    return pipe
+
+
+@lru_cache(maxsize=1)
+def get_jax_pipeline():
+    """
+    Builds a Whisper JAX pipeline when explicitly enabled.
+
+    On TPU/GPU deployments the JIT-compiled XLA pipeline with bf16
+    intermediates is dramatically faster than the PyTorch paths; the
+    first call pays the compilation cost and later calls reuse the
+    cached executable. Opt in by setting the WHISPER_JAX environment
+    variable. Returns None when disabled or when whisper-jax is not
+    installed.
+
+    Returns:
+        The FlaxWhisperPipline, or None if unavailable.
+    """
+    if not os.getenv("WHISPER_JAX"):
+        return None
+
+    try:
+        import jax.numpy as jnp
+        from whisper_jax import FlaxWhisperPipline
+    except ImportError:
+        return None
+
+    return FlaxWhisperPipline("openai/whisper-base", dtype=jnp.bfloat16)
+
+
+@lru_cache(maxsize=1)
+def get_whispercpp():
+    """
+    Loads a whisper.cpp model when explicitly enabled.
+
+    whisper.cpp uses quantized GGML weights (memory-mapped, Q5_0 by
+    default) and hand-written SIMD kernels, which typically beats even
+    CTranslate2 on CPU-only hosts. Opt in by setting WHISPER_CPP to
+    the model name to load (e.g. "base-q5_0"). Returns None when
+    disabled or when pywhispercpp is not installed.
+
+    Returns:
+        The pywhispercpp Model, or None if unavailable.
+    """
+    model_name = os.getenv("WHISPER_CPP")
+    if not model_name:
+        return None
+
+    try:
+        from pywhispercpp.model import Model
+    except ImportError:
+        return None
+
+    return Model(model_name, n_threads=os.cpu_count())
 
 
 def transcribe_audio(file_path: str) -> str:
@@ -13,55 +200,552 @@ def transcribe_audio(file_path: str) -> str:
     Returns:
         The transcription of the audio file.
     """
-    model = whisper.load_model("base")
-    result = model.transcribe(file_path)
-    return result["text"]
+    jax_pipe = get_jax_pipeline()
+    if jax_pipe is not None:
+        return jax_pipe(file_path)["text"]
 
+    pipe = get_gpu_pipeline()
+    if pipe is not None:
+        result = pipe(
+            file_path, chunk_length_s=30, batch_size=24, return_timestamps=True
+        )
+        return result["text"]
 
-def analyze_vocal_delivery(file_path: str) -> dict:
+    cpp_model = get_whispercpp()
+    if cpp_model is not None:
+        return "".join(s.text for s in cpp_model.transcribe(file_path))
+
+    model = get_whisper()
+
+    # For long recordings, split on silence and transcribe the chunks
+    # concurrently. The duration comes from the header alone; files
+    # soundfile cannot inspect (e.g. WebM) go through the single-shot
+    # path and are decoded by faster-whisper itself.
+    try:
+        duration = sf.info(file_path).duration
+    except RuntimeError:
+        duration = 0.0
+
+    if duration > PARALLEL_THRESHOLD_SECONDS:
+        return _transcribe_long(model, file_path)
+
+    # Decode once at Whisper's native 16 kHz and hand the array to the
+    # model, skipping its internal decode-and-resample pass. Saved
+    # sessions are already 16 kHz WAV, so no resample happens at all.
+    y, _ = _load_audio(file_path, target_sr=16000)
+    return _transcribe_array(model, y)
+
+
+# Bounded LRU of recent chunk transcripts keyed by a hash of the raw
+# samples, so identical chunks (sustained silence, client retransmits)
+# cost a dict lookup instead of a model forward pass
+_CHUNK_CACHE: OrderedDict = OrderedDict()
+CHUNK_CACHE_SIZE = 256
+
+
+def transcribe_audio_chunk(audio_chunk: np.ndarray) -> str:
     """
-    Analyzes the vocal delivery of a speech from an audio file.
+    Transcribes a short PCM chunk from the live websocket stream.
+
+    Args:
+        audio_chunk: Mono float32 samples at 16 kHz.
+
+    Returns:
+        The transcription of the chunk.
+    """
+    key = hashlib.blake2b(audio_chunk.tobytes(), digest_size=16).digest()
+    if key in _CHUNK_CACHE:
+        _CHUNK_CACHE.move_to_end(key)
+        return _CHUNK_CACHE[key]
+
+    text = _transcribe_array(get_whisper(), audio_chunk)
+    _CHUNK_CACHE[key] = text
+    if len(_CHUNK_CACHE) > CHUNK_CACHE_SIZE:
+        _CHUNK_CACHE.popitem(last=False)
+    return text
+
+
+def chunk_has_speech(audio_chunk: np.ndarray, threshold: float = 0.01) -> bool:
+    """
+    Cheap energy-based voice-activity gate for live chunks.
+
+    A silent chunk still costs a full Whisper forward pass, so the
+    dispatcher checks this first — one framed RMS reduction — and
+    skips inference entirely when nothing crosses the threshold. The
+    absolute threshold is deliberately permissive: quiet speech must
+    still pass.
+
+    Args:
+        audio_chunk: Mono float32 samples at 16 kHz.
+        threshold: Minimum per-frame RMS that counts as speech.
+
+    Returns:
+        True if any frame looks voiced.
+    """
+    if len(audio_chunk) < FRAME_LENGTH:
+        return bool(np.sqrt((audio_chunk**2).mean()) > threshold)
+
+    frames = librosa.util.frame(
+        audio_chunk, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH
+    )
+    rms = np.sqrt((frames**2).mean(axis=0))
+    return bool((rms > threshold).any())
+
+
+@lru_cache(maxsize=1)
+def get_batched_pipeline():
+    """Wraps the shared model in faster-whisper's batched pipeline."""
+    return BatchedInferencePipeline(get_whisper())
+
+
+# Silence inserted between batched chunks so the VAD ends every
+# segment inside its own chunk instead of spanning two sessions
+BATCH_SPACER_SECONDS = 1.0
+
+
+def transcribe_audio_chunks(chunks: list) -> list:
+    """
+    Transcribes several live chunks in one batched call.
+
+    Chunks collected across sessions are concatenated into a single
+    waveform and run through the batched pipeline, so a handful of
+    3-second chunks share one encoder pass instead of paying Whisper's
+    30-second window each. A silence spacer separates every splice:
+    the chunks can come from different sessions, and without it a
+    segment spanning a splice would hand one user's words to another's
+    transcript. Each returned segment is assigned to the chunk whose
+    span contains its midpoint, with the spacer time excluded.
+
+    Args:
+        chunks: Mono float32 waveforms at 16 kHz.
+
+    Returns:
+        One transcription per chunk, in input order.
+    """
+    if len(chunks) == 1:
+        return [transcribe_audio_chunk(chunks[0])]
+
+    sr = 16000
+    spacer = np.zeros(int(BATCH_SPACER_SECONDS * sr), dtype=np.float32)
+    pieces = []
+    ends = []  # end time of each chunk inside the spliced waveform
+    elapsed = 0.0
+    for i, chunk in enumerate(chunks):
+        if i > 0:
+            pieces.append(spacer)
+            elapsed += BATCH_SPACER_SECONDS
+        pieces.append(chunk)
+        elapsed += len(chunk) / sr
+        ends.append(elapsed)
+
+    segments, _ = get_batched_pipeline().transcribe(
+        np.concatenate(pieces), beam_size=1, batch_size=8, vad_filter=True
+    )
+
+    texts = [""] * len(chunks)
+    ends_arr = np.asarray(ends)
+    for segment in segments:
+        midpoint = (segment.start + segment.end) / 2
+        index = min(int(np.searchsorted(ends_arr, midpoint)), len(chunks) - 1)
+        texts[index] += segment.text
+    return texts
+
+
+def _load_audio(file_path: str, target_sr: int = None) -> tuple:
+    """
+    Decodes an audio file to a mono float32 waveform.
+
+    Reads through libsndfile directly, avoiding the slower
+    audioread/ffmpeg fallback that librosa.load routes through for
+    files it could hand to soundfile anyway. Containers libsndfile
+    does not understand (e.g. WebM) still take the librosa path.
 
     Args:
         file_path: The path to the audio file.
+        target_sr: Optional sample rate to resample to.
 
     Returns:
-        A dictionary containing the following metrics:
-        - speaking_rate: Words per minute.
-        - pitch_variance: Standard deviation of the pitch.
-        - long_pauses_count: Number of pauses longer than 1.5 seconds.
+        A (waveform, sample_rate) tuple.
     """
-    # Load the audio file
-    y, sr = librosa.load(file_path)
+    try:
+        y, sr = sf.read(file_path, dtype="float32", always_2d=False)
+    except RuntimeError:
+        return librosa.load(file_path, sr=target_sr, mono=True)
+
+    if y.ndim > 1:
+        y = y.mean(axis=1)
+    if target_sr is not None and sr != target_sr:
+        y = librosa.resample(y, orig_sr=sr, target_sr=target_sr, res_type="polyphase")
+        sr = target_sr
+    return y, sr
+
+
+def _transcribe_array(model, audio: np.ndarray) -> str:
+    """Transcribes a float32 waveform with the given model."""
+    segments, _ = model.transcribe(audio, beam_size=1, vad_filter=True)
+    return "".join(segment.text for segment in segments)
 
-    # 1. Calculate Speaking Rate (WPM)
-    transcription = transcribe_audio(file_path)
-    word_count = len(transcription.split())
+
+def _chunk_boundaries(y: np.ndarray, sr: int) -> list:
+    """
+    Finds sample offsets that split a waveform into roughly
+    CHUNK_TARGET_SECONDS chunks, cutting only inside silent gaps so
+    that no word is sliced in half.
+
+    Args:
+        y: The waveform.
+        sr: Its sample rate.
+
+    Returns:
+        A sorted list of boundary sample indices, starting with 0 and
+        ending with len(y).
+    """
+    frames = librosa.util.frame(y, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)
+    rms = np.sqrt((frames**2).mean(axis=0))
+    intervals = _non_silent_intervals(rms)
+
+    boundaries = [0]
+    if len(intervals) > 1:
+        # Candidate cuts sit in the middle of each silent gap
+        gap_midpoints = (intervals[:-1, 1] + intervals[1:, 0]) // 2
+        target = CHUNK_TARGET_SECONDS * sr
+        for cut in gap_midpoints:
+            if cut - boundaries[-1] >= target:
+                boundaries.append(int(cut))
+    boundaries.append(len(y))
+    return boundaries
+
+
+def _transcribe_long(model, file_path: str) -> str:
+    """
+    Transcribes a long recording by splitting it on silence into
+    roughly 30-second chunks processed concurrently on the shared
+    model. CTranslate2 releases the GIL during inference, so a thread
+    pool scales across cores.
+
+    Args:
+        model: The shared WhisperModel instance.
+        file_path: The path to the audio file.
+
+    Returns:
+        The concatenated transcription, in chunk order.
+    """
+    y, sr = _load_audio(file_path, target_sr=16000)
+    boundaries = _chunk_boundaries(y, sr)
+    chunks = [y[start:end] for start, end in zip(boundaries[:-1], boundaries[1:])]
+
+    if len(chunks) == 1:
+        return _transcribe_array(model, y)
+
+    workers = min(len(chunks), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        texts = pool.map(lambda chunk: _transcribe_array(model, chunk), chunks)
+    return "".join(texts)
+
+
+def _non_silent_intervals(rms: np.ndarray, top_db: float = 20.0) -> np.ndarray:
+    """
+    Derives non-silent sample intervals from per-frame RMS energy.
+
+    A frame counts as non-silent when its energy is within top_db
+    decibels of the loudest frame, mirroring the threshold used by
+    librosa.effects.split but working on an RMS array that the caller
+    has already computed.
+
+    Args:
+        rms: Per-frame RMS values.
+        top_db: Threshold in dB below the peak frame energy.
+
+    Returns:
+        An (N, 2) array of (start, end) sample indices.
+    """
+    ref = rms.max()
+    if ref <= 0:
+        return np.empty((0, 2), dtype=int)
+
+    db = 20.0 * np.log10(np.maximum(rms, 1e-10) / ref)
+    return _loud_runs(db, top_db) * HOP_LENGTH
+
+
+@njit(cache=True)
+def _loud_runs(db: np.ndarray, top_db: float) -> np.ndarray:
+    """
+    Run-length scans per-frame dB values for stretches above the
+    threshold.
+
+    Compiled with numba so the scan runs as native code over the frame
+    array; the run tracking is inherently sequential, so there is no
+    prange here, but LLVM still auto-vectorizes the comparisons.
+
+    Args:
+        db: Per-frame level relative to the loudest frame, in dB.
+        top_db: Threshold below the peak, in dB.
+
+    Returns:
+        An (N, 2) array of (start, end) frame indices.
+    """
+    n = db.shape[0]
+    out = np.empty((n // 2 + 1, 2), dtype=np.int64)
+    count = 0
+    in_run = False
+    start = 0
+    for i in range(n):
+        loud = db[i] > -top_db
+        if loud and not in_run:
+            start = i
+            in_run = True
+        elif not loud and in_run:
+            out[count, 0] = start
+            out[count, 1] = i
+            count += 1
+            in_run = False
+    if in_run:
+        out[count, 0] = start
+        out[count, 1] = n
+        count += 1
+    return out[:count]
+
+
+def warm_kernels():
+    """Triggers numba compilation ahead of the first real request."""
+    _loud_runs(np.zeros(2, dtype=np.float64), 20.0)
+
+
+def warm_models():
+    """
+    Loads the Whisper model and runs a throwaway inference.
+
+    Called at server startup so the first real request does not pay the
+    model-load cost or the lazy CTranslate2 kernel initialisation; the
+    batched pipeline used by the live chunk path is built here too.
+    """
+    model = get_whisper()
+    get_batched_pipeline()
+    segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1)
+    for _ in segments:
+        pass
+
+
+def _audio_features(file_path: str) -> dict:
+    """
+    Extracts the transcript-independent vocal metrics from a recording.
+
+    Everything here is pure signal processing (duration, pitch, pause
+    detection), so it can run concurrently with transcription; the
+    word-based metrics are layered on afterwards by
+    _combine_with_transcript.
+
+    Args:
+        file_path: The path to the audio file.
+
+    Returns:
+        A dict with duration, pitch_variance, pitch_over_time and
+        long_pauses_count.
+    """
+    # Load the audio file
+    y, sr = _load_audio(file_path)
     duration = librosa.get_duration(y=y, sr=sr)
-    speaking_rate = (word_count / duration) * 60 if duration > 0 else 0
 
-    # 2. Calculate Pitch Variance (Monotone Score)
-    f0, _, _ = librosa.pyin(
-        y, fmin=librosa.note_to_hz("C2"), fmax=librosa.note_to_hz("C7"), sr=sr
-    )
-    # Filter out unvoiced frames (NaNs) before calculating variance
-    voiced_f0 = f0[~np.isnan(f0)]
-    pitch_variance = np.std(voiced_f0) if voiced_f0.size > 0 else 0
+    # Recordings shorter than one analysis frame cannot be framed for
+    # pitch or pause detection (librosa raises on them); report
+    # neutral features instead, mirroring the guard in
+    # chunk_has_speech.
+    if y.size < FRAME_LENGTH:
+        return {
+            "duration": duration,
+            "pitch_variance": 0,
+            "pitch_over_time": [],
+            "long_pauses_count": 0,
+        }
+
+    # Calculate Pitch Variance (Monotone Score)
+    # Pitch variance only needs coarse f0, so run pyin on a cheap
+    # polyphase downsample with the search band narrowed to the speech
+    # range instead of C2-C7 — both shrink the YIN lag search.
+    y_pitch = librosa.resample(y, orig_sr=sr, target_sr=PITCH_SR, res_type="polyphase")
+    pitch_variance = 0
+    pitch_over_time = []
+    # The downsample can leave clips of a few tenths of a second under
+    # one pyin frame; skip pitch for those rather than raise
+    if y_pitch.size >= FRAME_LENGTH:
+        f0, _, _ = librosa.pyin(y_pitch, fmin=PITCH_FMIN, fmax=PITCH_FMAX, sr=PITCH_SR)
+        # pyin marks unvoiced frames as NaN; a nan-aware reduction
+        # skips them without materializing a masked copy of the voiced
+        # values
+        voiced_mask = ~np.isnan(f0)
+        if voiced_mask.any():
+            pitch_variance = float(np.nanstd(f0))
 
-    # 3. Detect and Count Long Pauses
-    # Split audio into non-silent segments
-    non_silent_intervals = librosa.effects.split(y, top_db=20)
+        # Pitch-over-time series for the UI chart: up to 100 evenly
+        # spaced points, each the mean of one fixed stride of the
+        # voiced track — a single reshape plus one reduction, no
+        # interpolation temporaries
+        voiced_f0 = f0[voiced_mask]
+        if voiced_f0.size > 0:
+            step = max(1, voiced_f0.size // 100)
+            points = min(100, voiced_f0.size // step)
+            pitch_over_time = (
+                voiced_f0[: step * points].reshape(points, step).mean(axis=1).tolist()
+            )
+
+    # Detect and Count Long Pauses
+    # Frame the signal once and derive non-silent intervals from the
+    # per-frame RMS energy, instead of letting librosa.effects.split
+    # re-frame and re-scan the same samples.
+    frames = librosa.util.frame(y, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)
+    rms = np.sqrt((frames**2).mean(axis=0))
+    non_silent_intervals = _non_silent_intervals(rms)
     long_pauses_count = 0
     if len(non_silent_intervals) > 1:
-        for i in range(len(non_silent_intervals) - 1):
-            pause_start = non_silent_intervals[i][1]
-            pause_end = non_silent_intervals[i + 1][0]
-            pause_duration = (pause_end - pause_start) / sr
-            if pause_duration > 1.5:
-                long_pauses_count += 1
+        # Gap between each interval's end and the next one's start,
+        # computed in a single vectorized pass
+        pauses = (non_silent_intervals[1:, 0] - non_silent_intervals[:-1, 1]) / sr
+        long_pauses_count = int((pauses > 1.5).sum())
 
     return {
-        "speaking_rate": speaking_rate,
+        "duration": duration,
         "pitch_variance": pitch_variance,
+        "pitch_over_time": pitch_over_time,
         "long_pauses_count": long_pauses_count,
     }
+
+
+def _combine_with_transcript(features: dict, transcript: str) -> dict:
+    """
+    Adds the word-based metrics to pre-computed audio features.
+
+    Args:
+        features: The output of _audio_features.
+        transcript: The transcript of the same recording.
+
+    Returns:
+        The full vocal-delivery metrics dict.
+    """
+    word_count = len(transcript.split())
+    duration = features["duration"]
+    speaking_rate = (word_count / duration) * 60 if duration > 0 else 0
+
+    # Pace-over-time series for the UI chart. Without per-word
+    # timestamps the word count is spread evenly across fixed-size
+    # windows, so the whole series is one np.full allocation rather
+    # than a Python append loop.
+    chunk_size_seconds = 10
+    num_chunks = max(1, int(duration // chunk_size_seconds))
+    wpm_chunk = (word_count / num_chunks / chunk_size_seconds) * 60
+    pace_over_time = np.full(num_chunks, wpm_chunk).tolist()
+
+    return {
+        "speaking_rate": speaking_rate,
+        "pace_over_time": pace_over_time,
+        "pitch_variance": features["pitch_variance"],
+        "pitch_over_time": features["pitch_over_time"],
+        "long_pauses_count": features["long_pauses_count"],
+    }
+
+
+def analyze_vocal_delivery(file_path: str) -> dict:
+    """
+    Analyzes the vocal delivery of a speech from an audio file.
+
+    Args:
+        file_path: The path to the audio file.
+
+    Returns:
+        A dictionary containing the following metrics:
+        - speaking_rate: Words per minute.
+        - pace_over_time: Words per minute for each 10-second window.
+        - pitch_variance: Standard deviation of the pitch.
+        - pitch_over_time: Up to 100 evenly spaced voiced-pitch points.
+        - long_pauses_count: Number of pauses longer than 1.5 seconds.
+    """
+    return _combine_with_transcript(_audio_features(file_path), transcribe_audio(file_path))
+
+
+def analyze_chunk_for_fillers(transcript_chunk: str) -> list:
+    """
+    Detects filler words in a transcript chunk.
+
+    The chunk is scanned in one pass with a pre-compiled regex instead
+    of a per-word substring search, which matters because this runs on
+    the real-time feedback path.
+
+    Args:
+        transcript_chunk: A short transcript snippet.
+
+    Returns:
+        The distinct filler words found, lowercased and sorted.
+    """
+    return sorted({m.group(1).lower() for m in FILLER_RE.finditer(transcript_chunk)})
+
+
+@lru_cache(maxsize=None)
+def get_content_model(model_name: str = "gemini-1.5-flash-latest"):
+    """
+    Configures Gemini once per model and returns it for reuse.
+
+    Args:
+        model_name: The Gemini model to instantiate.
+
+    Returns:
+        The GenerativeModel used for transcript analysis.
+    """
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return genai.GenerativeModel(model_name)
+
+
+def analyze_content(transcript: str) -> dict:
+    """
+    Analyzes the content of a speech transcript using Gemini.
+
+    Args:
+        transcript: The transcript of the speech.
+
+    Returns:
+        A dictionary containing the following keys:
+        - filler_word_counts: Per-word usage counts as a list of
+          {word, count} entries.
+        - clarity_score: A 1-10 rating of how clear the speech is.
+        - suggestions: A list of concrete improvement suggestions.
+        - improved_sentence: A rewritten version of the weakest sentence.
+    """
+    # The transcript fully determines the request, so an unchanged
+    # transcript (page refresh, re-analyze) can skip the network
+    # round-trip entirely.
+    key = hashlib.blake2b(transcript.encode(), digest_size=16).hexdigest()
+    cache_path = os.path.join(CONTENT_CACHE_DIR, f"content_{key}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    # Short transcripts do not need the full flash model
+    if len(transcript) < SHORT_TRANSCRIPT_CHARS:
+        model = get_content_model("gemini-1.5-flash-8b")
+    else:
+        model = get_content_model()
+
+    prompt = f"""You are an expert public speaking coach. Analyze the following speech transcript and report:
+- "filler_word_counts": a list of {{"word", "count"}} entries, one per filler word used (e.g. "um", "uh", "like", "so", "you know")
+- "clarity_score": an integer from 1 to 10 rating how clear and well-structured the speech is
+- "suggestions": a list of 2-3 concrete suggestions for improvement
+- "improved_sentence": the weakest sentence from the transcript, rewritten to be stronger
+
+Transcript:
+{transcript}"""
+
+    # Structured output guarantees parseable JSON, so no markdown-fence
+    # stripping is needed. Streaming lets the first tokens overlap the
+    # rest of the generation instead of waiting for the full response.
+    stream = model.generate_content(
+        prompt,
+        generation_config={
+            "response_mime_type": "application/json",
+            "response_schema": ContentReport,
+        },
+        stream=True,
+    )
+    report = json.loads("".join(chunk.text for chunk in stream))
+
+    os.makedirs(CONTENT_CACHE_DIR, exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(report, f)
+    return report
@@ -1,14 +1,65 @@
+import asyncio
 import logging
 import os
+import queue
+import subprocess
+import time
 import uuid
-from io import BytesIO
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from pydub import AudioSegment
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.websockets import WebSocketState
+
+from analysis import (
+    _audio_features,
+    _combine_with_transcript,
+    analyze_chunk_for_fillers,
+    analyze_content,
+    chunk_has_speech,
+    transcribe_audio,
+    transcribe_audio_chunks,
+    warm_kernels,
+    warm_models,
+)
+
+load_dotenv()
 
 # --- Configuration ---
 AUDIO_DIR = "audio_files"
+SAMPLE_RATE = 16000
+CHUNK_DURATION_SECONDS = 3
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
+# Whisper inference is CPU-bound and must never run on the event loop;
+# the pool is kept small so concurrent sessions do not thrash the CPU.
+INFERENCE_POOL = ThreadPoolExecutor(max_workers=2)
+
+# Chunk-transcription requests from every session funnel through this
+# queue so a single worker can batch them before touching the model.
+CHUNK_QUEUE: asyncio.Queue = asyncio.Queue()
+BATCH_MAX_CHUNKS = 8
+BATCH_WINDOW_SECONDS = 0.05
+
+# Partial transcripts accumulated during each live session, so the
+# analysis endpoint can reuse what was already transcribed instead of
+# re-running Whisper over the whole recording. Entries are popped by
+# the analysis endpoint; retention is bounded at disconnect so clients
+# that never call it cannot leak transcripts forever.
+SESSION_TRANSCRIPTS: OrderedDict = OrderedDict()
+MAX_RETAINED_SESSIONS = 32
+
+# Sessions that had to drop a chunk under load: their accumulated
+# partials are incomplete, so the analysis endpoint must not trust them.
+DROPPED_CHUNKS: set = set()
+
+# Sessions with a websocket currently open; their transcripts are
+# still growing and must never be evicted by the retention cap.
+ACTIVE_SESSIONS: set = set()
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,44 +70,374 @@ app = FastAPI()
 async def startup_event():
     logger.info("--- SERVER STARTUP ---")
     logger.info("Audio files will be saved to the '%s' directory.", AUDIO_DIR)
+    # Pay the numba compilation cost now, not on the first request
+    warm_kernels()
+    # Load Whisper and run a dummy inference off the event loop so the
+    # first real request starts from a warm model
+    await asyncio.get_running_loop().run_in_executor(INFERENCE_POOL, warm_models)
+    # Keep a reference: a bare create_task can be garbage-collected
+    # mid-run, which would silently stop all live-chunk transcription
+    app.state.batch_worker_task = asyncio.create_task(batch_worker())
+
+
+async def batch_worker():
+    """
+    Coalesces chunk-transcription requests into batched model calls.
+
+    Waits for the first request, then keeps collecting for a short
+    window (or until the batch is full) before handing everything to
+    transcribe_audio_chunks in one executor submission. Results are
+    routed back to each session through its future.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await CHUNK_QUEUE.get()]
+        deadline = loop.time() + BATCH_WINDOW_SECONDS
+        while len(batch) < BATCH_MAX_CHUNKS:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(CHUNK_QUEUE.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        chunks = [audio for audio, _ in batch]
+        try:
+            texts = await loop.run_in_executor(
+                INFERENCE_POOL, transcribe_audio_chunks, chunks
+            )
+            for (_, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+def start_decoder() -> subprocess.Popen:
+    """
+    Starts a long-lived FFmpeg process for one websocket session.
+
+    The process reads the WebM/Opus stream from stdin and emits 16 kHz
+    mono float32 PCM on stdout. Keeping it alive for the whole session
+    avoids paying process-fork and codec-init cost on every chunk.
+    """
+    return subprocess.Popen(
+        [
+            "ffmpeg",
+            "-loglevel", "quiet",
+            "-i", "pipe:0",
+            "-f", "f32le",
+            "-ac", "1",
+            "-ar", str(SAMPLE_RATE),
+            "pipe:1",
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        bufsize=1 << 20,
+    )
+
+
+async def analyze_and_feedback(websocket: WebSocket, session_id: str, audio_chunk: np.ndarray):
+    """
+    Transcribes one live chunk and pushes filler-word feedback.
+
+    The chunk goes through the shared batching queue, so the Whisper
+    forward pass runs off the event loop and can be coalesced with
+    chunks from other sessions.
+    """
+    try:
+        # Skip the (expensive) model entirely when the chunk is silent
+        if not chunk_has_speech(audio_chunk):
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        await CHUNK_QUEUE.put((audio_chunk, future))
+        transcript_chunk = await future
+
+        # The end-of-stream tail flush runs after the client is gone:
+        # its partial must still be recorded for the analysis
+        # endpoint, but events only go out on a live socket
+        connected = websocket.client_state == WebSocketState.CONNECTED
+
+        # Surface the transcript as it is produced instead of making
+        # the user wait for the end-of-session analysis call
+        if transcript_chunk.strip():
+            SESSION_TRANSCRIPTS.setdefault(session_id, []).append(transcript_chunk)
+            if connected:
+                await websocket.send_json(
+                    {"type": "PARTIAL_TRANSCRIPT", "text": transcript_chunk, "t": time.time()}
+                )
+
+        if connected:
+            for word in analyze_chunk_for_fillers(transcript_chunk):
+                await websocket.send_json({"type": "FILLER_WORD", "word": word})
+    except Exception as e:
+        logger.error(f"Chunk analysis failed for session {session_id}. Error: {e}")
+
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     session_id = str(uuid.uuid4())
+    ACTIVE_SESSIONS.add(session_id)
     logger.info(f"Client connected: {websocket.client.host}:{websocket.client.port} (Session: {session_id})")
-    
-    # Accumulate all received audio chunks in a single byte buffer
-    audio_buffer = BytesIO()
+
+    # Nothing about the session is held in RAM: the raw stream is
+    # appended to disk as a fallback in case decoding fails, and the
+    # decoded PCM streams straight into the final WAV as it is
+    # produced, so memory stays O(1) for arbitrarily long sessions.
+    raw_path = os.path.join(AUDIO_DIR, f"{session_id}.webm")
+    raw_file = open(raw_path, "ab")
+    output_path = os.path.join(AUDIO_DIR, f"{session_id}.wav")
+    wav_file = sf.SoundFile(
+        output_path, "w", samplerate=SAMPLE_RATE, channels=1, subtype="PCM_16"
+    )
+
+    # Decode incrementally as chunks arrive instead of spawning a new
+    # process for the whole stream at disconnect.
+    decoder = start_decoder()
+
+    loop = asyncio.get_running_loop()
+    pcm_queue: asyncio.Queue = asyncio.Queue()
+    write_queue: queue.Queue = queue.Queue()
+
+    def drain_writes():
+        # Input-side twin of drain_decoder: every websocket frame is
+        # appended to the raw file and fed to FFmpeg from this thread,
+        # keeping the per-frame blocking writes off the event loop.
+        while True:
+            data = write_queue.get()
+            if data is None:
+                break
+            raw_file.write(data)
+            if decoder.stdin.closed:
+                continue
+            try:
+                decoder.stdin.write(data)
+            except OSError:
+                # FFmpeg died mid-stream (e.g. corrupt input); keep
+                # archiving the raw bytes so the session is not lost
+                logger.error(f"Decoder rejected input for session {session_id}; keeping raw stream only")
+                decoder.stdin.close()
+
+    def drain_decoder():
+        while True:
+            block = decoder.stdout.read(1 << 16)
+            if not block:
+                break
+            # Convert to int16 in numpy before handing the block to
+            # libsndfile, so it writes the samples verbatim (half the
+            # bytes of float32) instead of converting one by one; the
+            # live analysis path keeps the float32 view.
+            samples = np.frombuffer(block, dtype=np.float32)
+            pcm = np.clip(samples * 32767.0, -32768, 32767).astype(np.int16)
+            wav_file.write(pcm)
+            loop.call_soon_threadsafe(pcm_queue.put_nowait, block)
+        loop.call_soon_threadsafe(pcm_queue.put_nowait, None)
+
+    async def dispatch_chunks():
+        """
+        Carves the decoded PCM into exact 3-second chunks.
+
+        Triggering on the decoded sample count (rather than any
+        byte-size heuristic on the compressed stream) means every
+        dispatched chunk is exactly CHUNK_DURATION_SECONDS long; the
+        remainder past each boundary carries over to the next chunk.
+        """
+        nonlocal busy
+        chunk_samples = CHUNK_DURATION_SECONDS * SAMPLE_RATE
+        pending = np.empty(0, dtype=np.float32)
+        while True:
+            block = await pcm_queue.get()
+            if block is None:
+                break
+            pending = np.concatenate(
+                [pending, np.frombuffer(block, dtype=np.float32)]
+            )
+            while len(pending) >= chunk_samples:
+                audio_chunk = pending[:chunk_samples]
+                pending = pending[chunk_samples:]
+                if busy:
+                    logger.info(
+                        f"Session {session_id}: analysis still running, dropping chunk"
+                    )
+                    DROPPED_CHUNKS.add(session_id)
+                    continue
+                busy = True
+                asyncio.create_task(guarded_analyze(audio_chunk))
+
+        # Flush the sub-chunk remainder at end-of-stream, awaited so
+        # the final words are in the accumulated transcript before the
+        # disconnect handler finishes.
+        if len(pending) > 0:
+            await analyze_and_feedback(websocket, session_id, pending)
+
+    # At most one chunk analysis in flight per session: when inference
+    # falls behind, newer chunks are dropped instead of piling up tasks
+    # whose feedback would arrive too late to be useful anyway. The
+    # flag is flipped synchronously before the task is spawned — a
+    # semaphore acquired inside the task would only lock once the task
+    # first runs, letting every chunk of a multi-chunk decoded block
+    # (stream catch-up after a stall) slip past the drop check.
+    busy = False
+
+    async def guarded_analyze(audio_chunk: np.ndarray):
+        nonlocal busy
+        try:
+            await analyze_and_feedback(websocket, session_id, audio_chunk)
+        finally:
+            busy = False
+
+    writer = loop.run_in_executor(None, drain_writes)
+    reader = loop.run_in_executor(None, drain_decoder)
+    dispatcher = asyncio.create_task(dispatch_chunks())
+
+    def finalize_files():
+        # close() flushes and os.remove hits the filesystem, so the
+        # whole finalization runs off the event loop — a slow disk
+        # here must not stall other sessions
+        raw_file.close()
+        decoded_frames = wav_file.tell()
+        wav_file.close()
+
+        if decoded_frames > 0:
+            os.remove(raw_path)
+            logger.info(f"Successfully saved audio for session {session_id} at {output_path}")
+        elif os.path.getsize(raw_path) > 0:
+            # Decoding produced nothing; keep the raw stream so the
+            # session is not lost entirely.
+            os.remove(output_path)
+            logger.warning(f"Decoder produced no PCM for session {session_id}; kept raw stream at {raw_path}")
+        else:
+            os.remove(output_path)
+            os.remove(raw_path)
+            logger.info(f"No audio data received for session {session_id}. Nothing to save.")
 
     try:
         while True:
             data = await websocket.receive_bytes()
-            audio_buffer.write(data)
+            write_queue.put_nowait(data)
     except WebSocketDisconnect:
         logger.warning(f"Client disconnected. Processing audio for session {session_id}...")
-        
-        # Ensure we have received some data before trying to process it
-        if audio_buffer.tell() > 0:
-            audio_buffer.seek(0)  # Rewind the buffer to the beginning
-            
+    except Exception as e:
+        logger.error(f"Receive loop failed for session {session_id}: {e}")
+    finally:
+        # Teardown runs on normal disconnect, decoder failure and
+        # server shutdown alike, so the FFmpeg process, the files and
+        # the background tasks never leak.
+        write_queue.put_nowait(None)
+        try:
+            # Let the writer drain its backlog before the decoder's
+            # stdin is closed, then flush the decoder; the PCM is
+            # already on disk, so the only work left is closing the
+            # files and picking what to keep.
+            await writer
             try:
-                # Use pydub to read the in-memory WebM/Opus audio
-                # and export it as a WAV file.
-                audio_segment = AudioSegment.from_file(audio_buffer, format="webm")
-                
-                # Define the output file path
-                output_path = os.path.join(AUDIO_DIR, f"{session_id}.wav")
-                
-                # Export the audio to WAV format
-                audio_segment.export(output_path, format="wav")
-                
-                logger.info(f"Successfully saved audio for session {session_id} at {output_path}")
-            except Exception as e:
-                logger.error(f"Failed to process audio for session {session_id}. Error: {e}")
-        else:
-            logger.info(f"No audio data received for session {session_id}. Nothing to save.")
+                decoder.stdin.close()
+            except OSError:
+                pass
+            await reader
+            await dispatcher
+            await asyncio.to_thread(decoder.wait)
+            await asyncio.to_thread(finalize_files)
+
+            # Keep this session's transcript around for the follow-up
+            # analysis call, evicting the oldest ended sessions beyond
+            # the cap (those that never asked for analysis). Sessions
+            # still connected are skipped: evicting one would truncate
+            # a transcript that is still growing while also clearing
+            # the flag that forces the full-file fallback.
+            if len(SESSION_TRANSCRIPTS) > MAX_RETAINED_SESSIONS:
+                for stale_id in list(SESSION_TRANSCRIPTS):
+                    if len(SESSION_TRANSCRIPTS) <= MAX_RETAINED_SESSIONS:
+                        break
+                    if stale_id in ACTIVE_SESSIONS:
+                        continue
+                    del SESSION_TRANSCRIPTS[stale_id]
+                    DROPPED_CHUNKS.discard(stale_id)
+        finally:
+            # Last-resort cleanup if the graceful path was interrupted
+            # (e.g. cancellation at server shutdown)
+            ACTIVE_SESSIONS.discard(session_id)
+            # A dropped-chunk flag only matters alongside retained
+            # partials; without them the analysis endpoint falls back
+            # to the file anyway, so clear the flag rather than leak it
+            if session_id not in SESSION_TRANSCRIPTS:
+                DROPPED_CHUNKS.discard(session_id)
+            if decoder.poll() is None:
+                decoder.kill()
+            if not raw_file.closed:
+                raw_file.close()
+            if not wav_file.closed:
+                wav_file.close()
+
+@app.get("/analysis/{session_id}")
+async def get_analysis(session_id: str):
+    """
+    Runs the full post-session analysis for a recorded session.
+
+    Transcription and the librosa feature extraction are independent,
+    so they run concurrently; the word-based vocal metrics and the
+    Gemini content call only need the transcript once it is ready.
+    Wall-clock is max(whisper, librosa) + content instead of the sum
+    of all three.
+    """
+    file_path = os.path.join(AUDIO_DIR, f"{session_id}.wav")
+    # Even a stat can stall the loop on network-backed disks
+    if not await asyncio.to_thread(os.path.exists, file_path):
+        raise HTTPException(status_code=404, detail="Session audio not found.")
+
+    loop = asyncio.get_running_loop()
+
+    # Reuse the transcript accumulated during the live session when we
+    # have one — skipping the full-file Whisper pass is the single
+    # biggest saving on long recordings. Sessions that never produced
+    # partials (e.g. raw uploads), or that had to drop a chunk under
+    # load, fall back to transcribing the file.
+    partials = SESSION_TRANSCRIPTS.pop(session_id, None)
+    dropped = session_id in DROPPED_CHUNKS
+    DROPPED_CHUNKS.discard(session_id)
+    if partials and not dropped:
+        transcript = "".join(partials)
+        features = await loop.run_in_executor(
+            INFERENCE_POOL, _audio_features, file_path
+        )
+    else:
+        transcript, features = await asyncio.gather(
+            loop.run_in_executor(INFERENCE_POOL, transcribe_audio, file_path),
+            loop.run_in_executor(INFERENCE_POOL, _audio_features, file_path),
+        )
+
+    vocal_delivery = _combine_with_transcript(features, transcript)
+    content = await loop.run_in_executor(None, analyze_content, transcript)
+
+    return {
+        "transcript": transcript,
+        "vocal_delivery": vocal_delivery,
+        "content": content,
+    }
 
 @app.get("/")
 async def get():
     return {"message": "AI Speaking Coach backend is running. Connect via WebSocket."}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvloop + httptools cut per-packet event-loop overhead, and the
+    # C-based websockets backend skips UTF-8 validation for the binary
+    # audio frames. A long ping interval keeps heartbeat chatter out of
+    # long recording sessions.
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_ping_interval=60,
+    )
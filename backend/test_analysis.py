@@ -1,9 +1,37 @@
+import json
 import os
 from unittest.mock import MagicMock
 
 import numpy as np
 import pytest
-from analysis import analyze_vocal_delivery, transcribe_audio
+
+import analysis
+from analysis import (
+    analyze_chunk_for_fillers,
+    analyze_content,
+    analyze_vocal_delivery,
+    chunk_has_speech,
+    get_batched_pipeline,
+    get_content_model,
+    get_whisper,
+    transcribe_audio,
+    transcribe_audio_chunk,
+    transcribe_audio_chunks,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_model_cache():
+    """Clears the cached models so each test gets a fresh mock."""
+    get_whisper.cache_clear()
+    get_batched_pipeline.cache_clear()
+    get_content_model.cache_clear()
+    analysis._CHUNK_CACHE.clear()
+    yield
+    get_whisper.cache_clear()
+    get_batched_pipeline.cache_clear()
+    get_content_model.cache_clear()
+    analysis._CHUNK_CACHE.clear()
 
 
 @pytest.fixture(autouse=True)
@@ -33,40 +61,91 @@ def mock_dependencies(mocker):
     mocker.patch(
         "analysis.transcribe_audio", return_value="This is a five-word transcription"
     )
+    # Deterministic 5s signal: speech for 1s, silence for 2s, speech
+    # for 2s. The 2s gap is what the pause detection should find.
+    dummy_signal = np.concatenate(
+        [np.ones(22050), np.zeros(2 * 22050), np.ones(2 * 22050)]
+    ).astype(np.float32)
+    mocker.patch("analysis.librosa.load", return_value=(dummy_signal, 22050))
+    mocker.patch("analysis.librosa.get_duration", return_value=5.0)
     mocker.patch(
-        "analysis.librosa.load", return_value=(np.random.randn(22050 * 5), 22050)
+        "analysis.librosa.resample", side_effect=lambda y, **kwargs: y
     )
-    mocker.patch("analysis.librosa.get_duration", return_value=5.0)
     mocker.patch(
         "analysis.librosa.pyin",
         return_value=(np.array([100.0, 110.0, 105.0, np.nan]), None, None),
     )
-    mocker.patch(
-        "analysis.librosa.effects.split",
-        return_value=np.array([[0, 1 * 22050], [3 * 22050, 5 * 22050]]),
-    )
 
 
 def test_transcribe_audio(mocker):
     """
     Tests the transcribe_audio function to ensure it returns the correct transcription text.
     """
-    # Mock the whisper library
+    # No GPU in the test environment: force the CPU fallback path
+    mocker.patch("analysis.get_gpu_pipeline", return_value=None)
+
+    # Mock the faster-whisper model and its segment generator
+    segment_one = MagicMock(text=" This is a test")
+    segment_two = MagicMock(text=" transcription.")
     mock_model = MagicMock()
-    mock_model.transcribe.return_value = {"text": "This is a test transcription."}
+    mock_model.transcribe.return_value = (iter([segment_one, segment_two]), MagicMock())
 
-    mock_whisper = mocker.patch("analysis.whisper.load_model", return_value=mock_model)
+    mock_whisper = mocker.patch("analysis.WhisperModel", return_value=mock_model)
+
+    # The waveform is decoded once and handed to the model directly
+    dummy_audio = np.zeros(16000, dtype=np.float32)
+    mocker.patch("analysis._load_audio", return_value=(dummy_audio, 16000))
 
     # Call the function with a dummy file path
     file_path = "audio_files/dummy_audio.wav"
     transcription = transcribe_audio(file_path)
 
     # Assert the result
-    assert transcription == "This is a test transcription."
+    assert transcription == " This is a test transcription."
+
+    # Verify that the model was created and called correctly
+    mock_whisper.assert_called_once_with(
+        "base", device="cpu", compute_type="int8", cpu_threads=os.cpu_count()
+    )
+    mock_model.transcribe.assert_called_once_with(
+        dummy_audio, beam_size=1, vad_filter=True
+    )
+
+    # A second call must reuse the cached model instead of reloading it
+    transcribe_audio(file_path)
+    mock_whisper.assert_called_once()
+
+
+def test_transcribe_audio_parallel_chunks(mocker):
+    """
+    Tests that long recordings are split on silence and transcribed
+    chunk by chunk, with the results joined in order.
+    """
+    mocker.patch("analysis.get_gpu_pipeline", return_value=None)
+    mocker.patch("analysis.sf.info", return_value=MagicMock(duration=61.0))
+
+    # 61s signal: 40s speech, 1s silence, 20s speech. The silent gap
+    # is past the 30s chunk target, so it becomes the single cut point.
+    sr = 16000
+    signal = np.concatenate(
+        [np.ones(40 * sr), np.zeros(sr), np.ones(20 * sr)]
+    ).astype(np.float32)
+    mocker.patch("analysis.librosa.load", return_value=(signal, sr))
+
+    # The first chunk (~40s) is longer than the second (~20s); key the
+    # mock on length so the result is deterministic across threads.
+    def fake_transcribe(audio, beam_size=1, vad_filter=True):
+        text = " First chunk." if len(audio) > 30 * sr else " Second chunk."
+        return (iter([MagicMock(text=text)]), MagicMock())
+
+    mock_model = MagicMock()
+    mock_model.transcribe.side_effect = fake_transcribe
+    mocker.patch("analysis.WhisperModel", return_value=mock_model)
 
-    # Verify that the whisper functions were called correctly
-    mock_whisper.assert_called_once_with("base")
-    mock_model.transcribe.assert_called_once_with(file_path)
+    transcription = transcribe_audio("audio_files/dummy_audio.wav")
+
+    assert transcription == " First chunk. Second chunk."
+    assert mock_model.transcribe.call_count == 2
 
 
 def test_analyze_vocal_delivery(mock_dependencies):
@@ -83,6 +162,10 @@ def test_analyze_vocal_delivery(mock_dependencies):
     assert "speaking_rate" in metrics
     assert metrics["speaking_rate"] == 60.0
 
+    # 1b. Test Pace Over Time
+    # 5 words over a single 10-second window = 30 WPM
+    assert metrics["pace_over_time"] == [30.0]
+
     # 2. Test Pitch Variance
     # Mocked f0 is [100.0, 110.0, 105.0, np.nan]
     # Voiced f0 is [100.0, 110.0, 105.0]
@@ -91,9 +174,137 @@ def test_analyze_vocal_delivery(mock_dependencies):
     assert "pitch_variance" in metrics
     assert np.isclose(metrics["pitch_variance"], expected_pitch_variance)
 
+    # 2b. Test Pitch Over Time
+    # Fewer than 100 voiced frames, so each one becomes its own point
+    assert metrics["pitch_over_time"] == [100.0, 110.0, 105.0]
+
     # 3. Test Long Pauses
-    # Mocked non-silent intervals: [[0, 1s], [3s, 5s]]
-    # Pause is from 1s to 3s, duration = 2s
+    # The dummy signal is silent from 1s to 3s, duration = 2s
     # 2s > 1.5s, so there is 1 long pause
     assert "long_pauses_count" in metrics
     assert metrics["long_pauses_count"] == 1
+
+
+def test_audio_features_short_recording(mocker):
+    """
+    Tests that a clip shorter than one analysis frame yields neutral
+    features instead of raising inside librosa's framing.
+    """
+    mocker.patch(
+        "analysis._load_audio",
+        return_value=(np.zeros(100, dtype=np.float32), 22050),
+    )
+    features = analysis._audio_features("audio_files/dummy_audio.wav")
+
+    assert features["pitch_variance"] == 0
+    assert features["pitch_over_time"] == []
+    assert features["long_pauses_count"] == 0
+
+
+def test_analyze_content(mocker, tmp_path):
+    """
+    Tests the analyze_content function with a mocked Gemini response.
+    """
+    mocker.patch("analysis.CONTENT_CACHE_DIR", str(tmp_path))
+    report = {
+        "filler_word_counts": [{"word": "um", "count": 2}],
+        "clarity_score": 7,
+        "suggestions": ["Slow down."],
+        "improved_sentence": "A stronger sentence.",
+    }
+    # The streamed response arrives as text chunks that join into JSON
+    text = json.dumps(report)
+    stream = [MagicMock(text=text[: len(text) // 2]), MagicMock(text=text[len(text) // 2 :])]
+    mock_model = MagicMock()
+    mock_model.generate_content.return_value = iter(stream)
+    mock_get_model = mocker.patch(
+        "analysis.get_content_model", return_value=mock_model
+    )
+
+    result = analyze_content("This is um a test um transcript.")
+
+    # Structured output mode returns plain JSON
+    assert result == report
+    mock_model.generate_content.assert_called_once()
+
+    # Short transcripts should be routed to the smaller model
+    mock_get_model.assert_called_once_with("gemini-1.5-flash-8b")
+
+    # An identical transcript must be served from the on-disk cache
+    # without another Gemini round-trip
+    assert analyze_content("This is um a test um transcript.") == report
+    mock_model.generate_content.assert_called_once()
+
+
+def test_analyze_chunk_for_fillers():
+    """
+    Tests that filler words are detected case-insensitively on word
+    boundaries and reported once each.
+    """
+    chunk = "So, um, I was like... Um, you know, this is likely fine."
+    assert analyze_chunk_for_fillers(chunk) == ["like", "so", "um", "you know"]
+
+    # "likely" must not match "like", and clean text yields nothing
+    assert analyze_chunk_for_fillers("This is likely fine.") == []
+
+
+def test_transcribe_audio_chunk(mocker):
+    """
+    Tests that live chunks are transcribed with the shared model.
+    """
+    segment = MagicMock(text=" um hello")
+    mock_model = MagicMock()
+    mock_model.transcribe.return_value = (iter([segment]), MagicMock())
+    mocker.patch("analysis.WhisperModel", return_value=mock_model)
+
+    audio_chunk = np.zeros(3 * 16000, dtype=np.float32)
+    assert transcribe_audio_chunk(audio_chunk) == " um hello"
+    mock_model.transcribe.assert_called_once_with(
+        audio_chunk, beam_size=1, vad_filter=True
+    )
+
+    # An identical chunk must be served from the LRU cache without
+    # another forward pass
+    assert transcribe_audio_chunk(audio_chunk.copy()) == " um hello"
+    mock_model.transcribe.assert_called_once()
+
+
+def test_transcribe_audio_chunks(mocker):
+    """
+    Tests that a batch of chunks shares one model call and that each
+    segment is mapped back to the chunk containing its midpoint.
+    """
+    sr = 16000
+    chunks = [
+        np.zeros(3 * sr, dtype=np.float32),  # covers 0s-3s
+        np.zeros(3 * sr, dtype=np.float32),  # covers 4s-7s after the spacer
+    ]
+
+    segments = [
+        MagicMock(start=0.5, end=2.5, text=" first"),
+        MagicMock(start=4.5, end=6.5, text=" second"),
+    ]
+    mock_pipeline = MagicMock()
+    mock_pipeline.transcribe.return_value = (iter(segments), MagicMock())
+    mocker.patch("analysis.get_batched_pipeline", return_value=mock_pipeline)
+
+    assert transcribe_audio_chunks(chunks) == [" first", " second"]
+    mock_pipeline.transcribe.assert_called_once()
+
+    # The spliced waveform must carry the 1s silence spacer between
+    # the chunks so the VAD separates them
+    spliced = mock_pipeline.transcribe.call_args.args[0]
+    assert len(spliced) == (3 + 1 + 3) * sr
+
+
+def test_chunk_has_speech():
+    """
+    Tests the energy gate that decides whether a chunk is worth
+    transcribing.
+    """
+    sr = 16000
+    loud = (0.5 * np.ones(3 * sr)).astype(np.float32)
+    silent = np.zeros(3 * sr, dtype=np.float32)
+
+    assert chunk_has_speech(loud) is True
+    assert chunk_has_speech(silent) is False